@@ -1,14 +1,30 @@
 #!/usr/bin/env python3
 
-import math
-import os
+import functools
 import re
+import sys
+import threading
+from collections import defaultdict
 from typing import Union
-from requests import Timeout
+from requests import HTTPError, Timeout
 from manager import ModPackages, Package
 
 ModPackages.init()
 
+# VT100 "erase display" + "cursor home", avoids spawning `clear` on every redraw
+_CLEAR = '\x1b[2J\x1b[H'
+
+# Mods generated by BepInEx itself, these are not expected to have a manifest in the game directory
+_SYSTEM_MODS = frozenset({'BepInExPack_Valheim', 'HookGenPatcher'})
+
+
+def _clear():
+    """
+    Clear the terminal display
+    """
+    sys.stdout.write(_CLEAR)
+    sys.stdout.flush()
+
 
 def _menu(
         title: str,
@@ -39,17 +55,13 @@ def _menu(
         Note, this is what the user _would_ enter by default, so the 0th index will be '1'.
     """
     if clear:
-        os.system('clear')
+        _clear()
 
     print(title + '\n')
 
-    space = math.floor(math.log10(len(options))) + 1
-
-    c = 0
-    for i in options:
-        c += 1
-        s = space - math.floor(math.log10(c))
-        print(str(c) + ':' + (' ' * s) + i[0])
+    # Pad the option numbers so all labels line up
+    space = len(str(len(options))) + 1
+    print('\n'.join(f'{str(c) + ":":<{space}} {i[0]}' for c, i in enumerate(options, 1)))
 
     if back:
         print('B: Go Back')
@@ -71,7 +83,7 @@ def _menu(
         return None
 
     if clear:
-        os.system('clear')
+        _clear()
     else:
         print('')
 
@@ -120,30 +132,45 @@ def menu_main():
         _wait()
 
 
-def check_environment():
+def _refresh_packages():
     """
-    Check the environment on starting to allow the user to sync existing mods easily
-
-    Nothing is returned, but if the user selects the default option, `import_existing` will be executed
+    Download a new copy of the Thunderstore packages list if the local cache is stale
     """
-
-    print('Checking manager environment...')
     if not ModPackages.check_packages_fresh():
         print('Thunderstore packages cache not fresh, downloading new copy...')
         try:
-            ModPackages.download_packages()
+            if not ModPackages.download_packages():
+                print('Thunderstore packages unchanged, using cached copy')
         except ConnectionError:
             print('Unable to connect to Thunderstore!  Please verify your internet connectivity.')
         except Timeout:
             print('Thunderstore took too long to respond, skipping package update')
+        except HTTPError as e:
+            print('Thunderstore returned an error (' + str(e.response.status_code) + '), skipping package update')
+
+
+def check_environment():
+    """
+    Check the environment on starting to allow the user to sync existing mods easily
+
+    Nothing is returned, but if the user selects the default option, `import_existing` will be executed
+    """
+
+    print('Checking manager environment...')
+    refresh = threading.Thread(target=_refresh_packages)
+    refresh.start()
+
+    # Reading the game manifests only needs the filesystem, so do that while the package list downloads
+    manifests = ModPackages.get_game_manifests()
+    refresh.join()
 
     print('Loading manager...')
     ModPackages.load_caches()
 
     print('Checking local game environment...')
-    mods = []
+    mods = set()
     diff = False
-    game = ModPackages.get_synced_packages()
+    game = ModPackages.get_synced_packages(manifests)
     for pkg in game:
         if pkg.installed_version is None:
             # Mod in game directory is not registered as installed
@@ -154,11 +181,11 @@ def check_environment():
             print(pkg.name + ' ' + pkg.selected_version + ' found in game directory differs from registered version')
             diff = True
 
-        mods.append(pkg.name)
+        mods.add(pkg.name)
     local = ModPackages.get_installed_packages()
     for pkg in local:
         # Skip auto-generated system mods
-        if pkg.name == 'BepInExPack_Valheim' or pkg.name == 'HookGenPatcher':
+        if pkg.name in _SYSTEM_MODS:
             continue
 
         if pkg.name not in mods:
@@ -209,8 +236,8 @@ def _list_mods(mode: str) -> str:
         'author': 0
     }
 
-    def print_row(row: dict):
-        print(
+    def format_row(row: dict) -> str:
+        return (
             '| ' +
             ' | '.join((
                 row['id'].rjust(2, ' '),
@@ -223,8 +250,8 @@ def _list_mods(mode: str) -> str:
             ' |'
         )
 
-    def print_sep():
-        print(
+    def format_sep() -> str:
+        return (
             '|-' +
             '-|-'.join((
                 '-'.rjust(2, '-'),
@@ -239,7 +266,7 @@ def _list_mods(mode: str) -> str:
 
     sorting = 'n'
     while True:
-        os.system('clear')
+        _clear()
 
         if mode == 'installed':
             mods = ModPackages.get_installed_packages()
@@ -275,15 +302,15 @@ def _list_mods(mode: str) -> str:
             print('Removed Mods')
         print('')
 
-        print_row({
+        print(format_row({
             'id': '#',
             'name': 'Mod Name',
             'version': 'Version',
             'date': 'Updated',
             'rating': 'Rating',
             'author': 'Author'
-        })
-        print_sep()
+        }))
+        print(format_sep())
 
         if sorting == 'v':
             mods = sorted(mods, key=lambda item: item.installed_version if item.installed_version is not None else '')
@@ -296,17 +323,20 @@ def _list_mods(mode: str) -> str:
         else:
             mods = sorted(mods, key=lambda item: item.name)
 
+        # Render the full table first so it's written to the terminal in one go
+        lines = []
         counter = 1
         for pkg in mods:
-            print_row({
+            lines.append(format_row({
                 'id': str(counter),
                 'name': pkg.name,
                 'version': pkg.installed_version if pkg.installed_version is not None else 'N/A',
                 'date': pkg.update.strftime('%Y.%m.%d'),
                 'rating': str(pkg.rating),
                 'author': pkg.owner
-            })
+            }))
             counter += 1
+        sys.stdout.write('\n'.join(lines) + '\n')
 
         print('')
         print('Change sorting by entering [n]ame, [v]ersion, [d]ate, [r]ating, or [a]uthor,')
@@ -323,6 +353,24 @@ def _list_mods(mode: str) -> str:
             sorting = opt
 
 
+@functools.lru_cache(maxsize=128)
+def _search(query: str) -> tuple:
+    """
+    Search for packages, memoized for repeated searches within a session
+
+    Parameters
+    ----------
+    query : str
+        Query to search against, see `ModPackages.search`
+
+    Returns
+    -------
+    tuple[Package]
+        Any/all packages located from the search
+    """
+    return tuple(ModPackages.search(query))
+
+
 def install_new():
     """
     Provide a UI to install a new mod from a search field
@@ -333,32 +381,34 @@ def install_new():
         'wait' is returned on changes to allow the user to see results,
         or None if nothing performed
     """
-    print('Install New Mod')
-    print('')
-    opt = input('Enter the mod name or URL to install (or ENTER to return): ')
+    while True:
+        print('Install New Mod')
+        print('')
+        opt = input('Enter the mod name or URL to install (or ENTER to return): ')
 
-    if opt == '':
-        return
+        if opt == '':
+            return
 
-    mod = None
-    mods = ModPackages.search(opt)
-    if len(mods) == 0:
-        print('No mods found!')
-        _wait()
-        return install_new()
-    elif len(mods) > 1:
-        mods.sort(reverse=True, key=lambda mod: mod.rating)
-        opts = []
-        for m in mods:
-            opts.append((m.name + ' by ' + m.owner + ' last updated ' + m.update.strftime('%Y-%m-%d'), m))
-        opt = _menu(title='Multiple mods found', options=opts, back=True, default='b')
-
-        if opt is None:
-            return install_new()
+        mods = list(_search(opt))
+        if len(mods) == 0:
+            print('No mods found!')
+            _wait()
+            continue
+        elif len(mods) > 1:
+            mods.sort(reverse=True, key=lambda mod: mod.rating)
+            opts = []
+            for m in mods:
+                opts.append((m.name + ' by ' + m.owner + ' last updated ' + m.update.strftime('%Y-%m-%d'), m))
+            opt = _menu(title='Multiple mods found', options=opts, back=True, default='b')
+
+            if opt is None:
+                continue
+            else:
+                mod = opt
         else:
-            mod = opt
-    else:
-        mod = mods[0]
+            mod = mods[0]
+
+        break
 
     opts = []
     for v in mod.versions:
@@ -384,6 +434,7 @@ def install_new():
         mod.install()
         print('Deploying to local game client...')
         ModPackages.sync_game()
+        ModPackages.flush()
         print('Mod installed')
         return 'wait'
     else:
@@ -437,14 +488,19 @@ def check_updates() -> str:
     print('')
     updates_available = False
     opts = [('Install all updates', 'ALL')]
-    for pkg in ModPackages.get_installed_packages():
-        updates = pkg.check_update_available()
-        v1 = pkg.get_installed_version().version
-        v2 = pkg.get_highest_version().version
+    pkgs = ModPackages.get_installed_packages()
 
-        if updates:
-            opts.append((pkg.name + ' ' + v1 + ' update available to ' + v2, pkg))
-            updates_available = True
+    # Update checks are resolved against the local packages cache, so one pass is all that's needed;
+    # only look up the version labels for mods which actually have an update pending.
+    results = [
+        (pkg, pkg.get_installed_version().version, pkg.get_highest_version().version)
+        for pkg in pkgs if pkg.check_update_available()
+    ]
+    upgradable = []
+    for pkg, v1, v2 in results:
+        opts.append((pkg.name + ' ' + v1 + ' update available to ' + v2, pkg))
+        upgradable.append(pkg)
+        updates_available = True
 
     if not updates_available:
         print('No mod updates are available!')
@@ -457,15 +513,19 @@ def check_updates() -> str:
         return ''
     elif opt == 'ALL':
         # User opted to perform ALL updates
-        for pkg in ModPackages.get_installed_packages():
-            if pkg.check_update_available():
-                pkg.upgrade()
-                print('Updated ' + pkg.name)
+        with ModPackages.batch():
+            for pkg in upgradable:
+                # An earlier upgrade may have already pulled this one in as a dependency
+                if pkg.check_update_available():
+                    pkg.upgrade()
+                    print('Updated ' + pkg.name)
         ModPackages.sync_game()
+        ModPackages.flush()
     else:
         # Specific package to update
         opt.upgrade()
         ModPackages.sync_game()
+        ModPackages.flush()
         print('Updated ' + opt.name)
 
     return 'wait'
@@ -524,14 +584,17 @@ def rollback() -> str:
         return ''
     elif opt == 'ALL':
         # User opted to perform ALL updates
-        for pkg in pkgs:
-            pkg.rollback()
-            print('Reverted ' + pkg.name)
+        with ModPackages.batch():
+            for pkg in pkgs:
+                pkg.rollback()
+                print('Reverted ' + pkg.name)
         ModPackages.sync_game()
+        ModPackages.flush()
     else:
         # Specific package to update
         opt.rollback()
         ModPackages.sync_game()
+        ModPackages.flush()
         print('Reverted ' + opt.name)
 
     return 'wait'
@@ -565,15 +628,17 @@ def remove() -> str:
         return ''
 
     if opt == '_ALL_':
-        for pkg in pkgs:
-            print('Removing mod ' + pkg.name + '...')
-            pkg.remove()
+        with ModPackages.batch():
+            for pkg in pkgs:
+                print('Removing mod ' + pkg.name + '...')
+                pkg.remove()
     else:
         print('Removing mod...')
         pkgs[opt].remove()
 
     print('Removing files from game client...')
     ModPackages.sync_game()
+    ModPackages.flush()
     print('Selected mod has been removed')
     return 'wait'
 
@@ -590,37 +655,30 @@ def import_existing() -> str:
     print('Scanning for current packages...')
     packages = ModPackages.get_synced_packages()
 
-    check = []
-    dupes = []
+    # Index the packages by name so duplicates can be found with hash lookups
+    by_name = defaultdict(list)
     for p in packages:
-        if p.name in check and p.name not in dupes:
-            dupes.append(p.name)
-        else:
-            check.append(p.name)
+        by_name[p.name].append(p)
+    dupes = [n for n, lst in by_name.items() if len(lst) > 1]
 
     if len(dupes) > 0:
         # The manifest doesn't contain all data to uniquely identify the source package,
         # and some authors will fork projects to publish under the same name.
         for d in dupes:
             opts = []
-            for p in packages:
-                if p.name == d:
-                    opts.append((p.name + ' by ' + p.owner + ' last updated ' + p.update.strftime('%Y-%m-%d'), p))
+            for p in by_name[d]:
+                opts.append((p.name + ' by ' + p.owner + ' last updated ' + p.update.strftime('%Y-%m-%d'), p))
             opt = _menu(title='Duplicates found for package, please select the one to install', options=opts)
 
-            # Since we can't modify a list while iterating over, (and modifying it will change the keys),
-            # create a copy list and copy valid entries over
-            p1 = []
-            for p in packages:
-                if p.name != d or p == opt:
-                    p1.append(p)
-            packages = p1
+            # Only keep the selected package for this name (if any)
+            by_name[d] = [opt] if opt is not None else []
 
-    print('')
-    for p in packages:
-        print('* ' + p.name + ' ' + p.selected_version)
+        packages = [p for lst in by_name.values() for p in lst]
 
+    print('')
     if len(packages) > 0:
+        sys.stdout.write(''.join('* ' + p.name + ' ' + p.selected_version + '\n' for p in packages))
+
         try:
             opt = input('ENTER to load current mods, CTRL+C to stop: ')
         except KeyboardInterrupt:
@@ -629,9 +687,11 @@ def import_existing() -> str:
         opt = 'n'
 
     if opt == '':
-        for p in packages:
-            print('Installing ' + p.name + ' ' + p.selected_version + '...')
-            p.install()
+        with ModPackages.batch():
+            for p in packages:
+                print('Installing ' + p.name + ' ' + p.selected_version + '...')
+                p.install()
+        ModPackages.flush()
 
         return 'wait'
 
@@ -642,12 +702,13 @@ def sync_existing() -> str:
     :return:
     """
     import_existing()
-    ModPackages.sync_game()
+    ModPackages.sync_game(full=True)
+    ModPackages.flush()
     return ''
 
 
 def _manage_mod(mod: Package):
-    os.system('clear')
+    _clear()
     if mod.installed_version is not None:
         print(mod.name + ' ' + mod.installed_version)
     else:
@@ -688,6 +749,7 @@ def _manage_mod(mod: Package):
 
         print('Removing files from game client...')
         ModPackages.sync_game()
+        ModPackages.flush()
 
         print('Selected mod has been removed')
         _wait()
@@ -697,6 +759,7 @@ def _manage_mod(mod: Package):
 
         print('Syncing game client...')
         ModPackages.sync_game()
+        ModPackages.flush()
 
         print('Updated ' + mod.name)
         _wait()
@@ -706,6 +769,7 @@ def _manage_mod(mod: Package):
 
         print('Syncing game client...')
         ModPackages.sync_game()
+        ModPackages.flush()
 
         print('Mod installed')
         _wait()
@@ -1,3 +1,5 @@
+import atexit
+import contextlib
 import os
 import logging
 import shutil
@@ -5,13 +7,305 @@ import requests
 import time
 import json
 import datetime
-import dateutil.parser
 import re
+import threading
 import yaml
 import zipfile
-import magic
 import paramiko
+import queue
+import shlex
+import tarfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from operator import attrgetter
+from pathlib import PurePosixPath
 from packaging import version
+from requests.adapters import HTTPAdapter
+
+try:
+    # Optional, considerably faster for the (multi-megabyte) packages list
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Shared HTTP session so connections to thunderstore.io are reused between downloads
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# Dependency strings, "owner-name-version"
+_DEP_RE = re.compile(r'([^-]+)-([^-]+)-([^-]+)')
+
+# Errors an SFTP call can raise, including the connection having dropped, (cleanup must never mask the original error)
+_SFTP_ERRORS = (IOError, paramiko.SSHException, EOFError)
+
+# Uploads of at least this many small files are sent to the server as a single tar stream,
+# (files below _TAR_MAX_SIZE bytes, larger ones are still faster over SFTP)
+_TAR_MIN_FILES = 200
+_TAR_MAX_SIZE = 64 * 1024
+
+# Seconds before the local packages list is checked against thunderstore.io again,
+# refreshing is a conditional request so an unchanged list costs next to nothing
+_PACKAGES_TTL = 900
+
+# Default number of concurrent package downloads, (download_workers in the config)
+_DOWNLOAD_WORKERS = 8
+
+# Maximum number of threads used to extract a single package
+_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+# Minimum number of files each extraction thread should be handed before it's worth spinning up
+_EXTRACT_CHUNK = 16
+
+# Flags for creating extracted files, (O_BINARY only exists on Windows, where it's required)
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+# Sort key for PackageVersion objects
+_VKEY = attrgetter('parsed_version')
+
+# Maximum number of threads used to copy files into the game directory
+_COPY_WORKERS = min(8, os.cpu_count() or 1)
+
+# Write buffer for export archives, zipfile issues many small writes (headers, compressed chunks)
+_ZIP_BUFFER = 1 << 20
+
+# File types which are already compressed, deflating these again only costs CPU time
+_STORED_EXT = frozenset({'.png', '.jpg', '.jpeg', '.webp', '.zip', '.gz', '.7z', '.ogg', '.mp3', '.mp4', '.webm'})
+
+
+def _stream_to_file(response: requests.Response, path: str):
+    """
+    Write the body of a streamed response to disk
+
+    The download is written to a temporary file first and only moved into place once complete,
+    so an interrupted download never leaves a truncated file in the cache.
+
+    Parameters
+    ----------
+    response : requests.Response
+        Response opened with `stream=True`
+    path : str
+        Filename to write
+    """
+    tmp = path + '.part'
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    except BaseException:
+        # Don't leave partial downloads lying around in the cache, (open itself may have failed)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def _parse_date(value: str) -> datetime.datetime:
+    """
+    Parse an ISO-8601 timestamp as provided by thunderstore.io
+
+    Parameters
+    ----------
+    value : str
+        Timestamp string, ie: "2023-03-14T21:18:13.141029Z"
+
+    Returns
+    -------
+    datetime.datetime
+        The parsed (timezone aware) datetime
+    """
+    # fromisoformat only understands the trailing 'Z' from Python 3.11 onwards
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _json_loads(data: bytes | str):
+    """
+    Decode a JSON document, using orjson when available
+
+    Parameters
+    ----------
+    data : bytes|str
+        Raw JSON document
+
+    Returns
+    -------
+    dict|list
+        The decoded data
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    else:
+        return json.loads(data)
+
+
+def _json_load(path: str):
+    """
+    Read a JSON file, using orjson when available
+
+    Parameters
+    ----------
+    path : str
+        Filename to read
+
+    Returns
+    -------
+    dict|list
+        The decoded data
+    """
+    with open(path, 'rb') as fp:
+        return _json_loads(fp.read())
+
+
+def _json_dump(obj, path: str, sort_keys: bool = False):
+    """
+    Write data to a (human-readable) JSON file, using orjson when available
+
+    Parameters
+    ----------
+    obj : dict|list
+        Data to write
+    path : str
+        Filename to write
+    sort_keys : bool
+        Set to write dictionary keys in sorted order
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        with open(path, 'wb') as fp:
+            fp.write(orjson.dumps(obj, option=option))
+    else:
+        with open(path, 'w') as fp:
+            json.dump(obj, fp, indent=2, sort_keys=sort_keys)
+
+
+def _walk_files(root: str):
+    """
+    Recursively iterate over all files within a directory
+
+    Same traversal order as `os.walk`, but yields the `os.DirEntry` of each file so the type
+    and stat information already fetched while scanning can be reused.
+    Symlinks are skipped entirely and a missing directory simply yields nothing.
+
+    Parameters
+    ----------
+    root : str
+        Directory to scan
+
+    Returns
+    -------
+    Iterator[os.DirEntry]
+        Every file found under the directory
+    """
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        return
+
+    dirs = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            dirs.append(entry)
+        elif entry.is_file(follow_symlinks=False):
+            yield entry
+
+    for entry in dirs:
+        yield from _walk_files(entry.path)
+
+
+def _zip_write(zip: zipfile.ZipFile, path: str, arcname: str):
+    """
+    Add a file to an export archive
+
+    Files which are already compressed are stored as-is, everything else is deflated at a low level
+    which gets most of the size savings for a fraction of the CPU time.
+
+    Parameters
+    ----------
+    zip : zipfile.ZipFile
+        Archive opened for writing
+    path : str
+        Local file to add
+    arcname : str
+        Name of the file within the archive
+    """
+    if os.path.splitext(path)[1].lower() in _STORED_EXT:
+        zip.write(path, arcname=arcname, compress_type=zipfile.ZIP_STORED)
+    else:
+        zip.write(path, arcname=arcname, compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+
+
+def _extract_members(archive: str, members: list[tuple[zipfile.ZipInfo, str]]):
+    """
+    Extract a set of files from a ZIP archive, their directories must already exist
+
+    Parameters
+    ----------
+    archive : str
+        Path of the ZIP archive to read
+    members : list[tuple[ZipInfo, str]]
+        Entry within the archive paired with the full filename to write it to
+    """
+    with zipfile.ZipFile(archive) as zip:
+        for info, filename in members:
+            # Write straight to the descriptor, each chunk is already large so a buffered writer only adds a copy,
+            # (same permissions as open() would give, 0o666 less the umask)
+            fd = os.open(filename, _WRITE_FLAGS, 0o666)
+            try:
+                # Opening by ZipInfo skips looking the name up again
+                with zip.open(info) as sfile:
+                    while True:
+                        buf = sfile.read(1 << 20)
+                        if not buf:
+                            break
+                        view = memoryview(buf)
+                        while view:
+                            view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+
+
+class RateLimiter:
+    """
+    Simple token bucket to keep requests to thunderstore.io under a given rate,
+    safe to share between threads
+
+    Attributes
+    ----------
+    rate : float
+        Number of requests allowed per second, zero (or less) disables the limit
+    """
+
+    def __init__(self, rate: float) -> None:
+        # Zero, negative and NaN rates all mean no limit, (they'd otherwise never let a request through)
+        if not rate > 0:
+            rate = 0.0
+        self.rate: float = rate
+        self._tokens: float = max(1.0, rate)
+        self._last: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until another request is allowed to be issued
+        """
+        if self.rate == 0:
+            # Unlimited
+            return
+
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                # Not enough budget yet, wait for the next token to become available
+                time.sleep((1 - self._tokens) / self.rate)
 
 
 class PackageVersion:
@@ -37,10 +331,15 @@ class PackageVersion:
         Version string of this version
     uuid : str
         Unique ID for this version
+    parsed_version : Version
+        Parsed form of `version`, (cached)
     """
 
+    # Thousands of these are created from the registry, skip the per-instance __dict__
+    __slots__ = ('created', 'dependencies', 'description', 'url', 'downloads', 'size', 'version', 'uuid', '_parsed')
+
     def __init__(self, data: dict) -> None:
-        self.created: datetime = dateutil.parser.isoparse(data['date_created'])
+        self.created: datetime = _parse_date(data['date_created'])
         self.dependencies: list = data['dependencies']
         self.description: str = data['description']
         self.url: str = data['download_url']
@@ -48,6 +347,21 @@ class PackageVersion:
         self.size: int = data['file_size']
         self.version: str = data['version_number']
         self.uuid: str = data['uuid4']
+        self._parsed = None
+
+    @property
+    def parsed_version(self) -> version.Version:
+        """
+        Parsed form of the version string for comparisons, only parsed once on first use
+
+        Returns
+        -------
+        Version
+            The parsed version
+        """
+        if self._parsed is None:
+            self._parsed = version.parse(self.version)
+        return self._parsed
 
 
 class Package:
@@ -64,6 +378,8 @@ class Package:
         Date this mod was last updated
     name : str
         Name of this mod, also used to create the directory structure
+    name_lower : str
+        Lowercase copy of the name, used for searching
     deprecated : bool
         If it's flagged as deprecated?  dunno
     owner : str
@@ -80,8 +396,18 @@ class Package:
         Used when installing a specific version, set to the version string
     installed_version : str|None
         Set as the currently installed version string
+    selected_parsed : Version|None
+        Parsed form of selected_version, for comparisons
+    installed_parsed : Version|None
+        Parsed form of installed_version, for comparisons
     """
 
+    __slots__ = (
+        'categories', 'created', 'update', 'name', 'name_lower', 'deprecated', 'owner', 'url', 'uuid', 'rating',
+        '_selected_version', '_selected_parsed', '_installed_version', '_installed_parsed',
+        '_versions_data', '_versions'
+    )
+
     overrides = {
         'BepInExPack_Valheim': {
             'source': 'BepInExPack_Valheim/',
@@ -91,20 +417,84 @@ class Package:
 
     def __init__(self, data: dict) -> None:
         self.categories: list = data['categories']
-        self.created: datetime = dateutil.parser.isoparse(data['date_created'])
-        self.update: datetime = dateutil.parser.isoparse(data['date_updated'])
+        self.created: datetime = _parse_date(data['date_created'])
+        self.update: datetime = _parse_date(data['date_updated'])
         self.name: str = data['name']
+        self.name_lower: str = self.name.lower()
         self.deprecated: bool = data['is_deprecated']
         self.owner: str = data['owner']
         self.url: str = data['package_url']
         self.uuid: str = data['uuid4']
         self.rating: int = data['rating_score']
-        self.versions: list[PackageVersion] = []
-        self.selected_version = None
-        self.installed_version = None
+        self._selected_version = None
+        self._selected_parsed = None
+        self._installed_version = None
+        self._installed_parsed = None
+
+        # The registry holds thousands of mods with many versions each, but only a handful are
+        # ever looked at in one session; keep the raw data until the versions are needed.
+        self._versions_data: list = data['versions']
+        self._versions = None
+
+    @property
+    def versions(self) -> list[PackageVersion]:
+        """
+        All versions available for this mod, constructed on first use
+
+        Returns
+        -------
+        list[PackageVersion]
+            List of all versions available for this mod
+        """
+        if self._versions is None:
+            self._versions = [PackageVersion(i) for i in self._versions_data]
+            self._versions_data = None
+        return self._versions
+
+    @property
+    def selected_version(self) -> str | None:
+        return self._selected_version
+
+    @selected_version.setter
+    def selected_version(self, value: str | None):
+        # Parsed lazily, most mods never have their selected version compared
+        self._selected_version = value
+        self._selected_parsed = None
+
+    @property
+    def selected_parsed(self) -> version.Version | None:
+        """
+        Parsed selected_version, cached until selected_version is changed
+
+        Returns
+        -------
+        Version|None
+        """
+        if self._selected_parsed is None and self._selected_version is not None:
+            self._selected_parsed = version.parse(self._selected_version)
+        return self._selected_parsed
+
+    @property
+    def installed_version(self) -> str | None:
+        return self._installed_version
 
-        for i in data['versions']:
-            self.versions.append(PackageVersion(i))
+    @installed_version.setter
+    def installed_version(self, value: str | None):
+        self._installed_version = value
+        self._installed_parsed = None
+
+    @property
+    def installed_parsed(self) -> version.Version | None:
+        """
+        Parsed installed_version, cached until installed_version is changed
+
+        Returns
+        -------
+        Version|None
+        """
+        if self._installed_parsed is None and self._installed_version is not None:
+            self._installed_parsed = version.parse(self._installed_version)
+        return self._installed_parsed
     
     def get_highest_version(self) -> PackageVersion:
         """
@@ -115,19 +505,7 @@ class Package:
         PackageVersion
             The version object representing this request
         """
-
-        highest_num = None
-        highest_pkg = None
-
-        for v in self.versions:
-            if highest_num is None:
-                highest_num = v.version
-                highest_pkg = v
-            elif version.parse(v.version) > version.parse(highest_num):
-                highest_num = v.version
-                highest_pkg = v
-        
-        return highest_pkg
+        return max(self.versions, key=_VKEY, default=None)
     
     def get_installed_version(self) -> PackageVersion:
         """
@@ -181,40 +559,58 @@ class Package:
 
     def install(self):
         """
-        Install the `selected_version` of this mod into the local cache
+        Install the `selected_version` of this mod (and any dependencies needed) into the local cache
+        """
+        plan = ModPackages.plan_install(self)
+
+        # Archives are independent of each other, so fetch any missing ones concurrently
+        with ThreadPoolExecutor(max_workers=ModPackages.config['download_workers']) as ex:
+            list(ex.map(lambda step: step[0]._download(step[1]), plan))
+
+        # Dependencies are ordered first within the plan
+        for p, v in plan:
+            p._install_version(v)
+
+    def _download(self, v: PackageVersion):
+        """
+        Internal method to download the archive for a given version into the local cache (if not there already)
+
+        Parameters
+        ----------
+        v : PackageVersion
+            The version to download
         """
-        if self.selected_version is not None:
-            v = self.get_version(self.selected_version)
-        else:
-            v = self.get_highest_version()
-        
-        logging.debug('Installing ' + self.name + ' ' + v.version)
-        
-        # Check any dependencies and install them first
-        for d in v.dependencies:
-            for p in ModPackages.search(d):
-                if p.installed_version is None:
-                    logging.debug('New dependency found, processing')
-                    p.install()
-                elif version.parse(p.installed_version) < version.parse(p.selected_version):
-                    # Check if the installed is higher or it needs to be updated
-                    logging.debug('Updated dependency found, processing')
-                    p.install()
-        
         target = self.name + '-' + v.version + '.zip'
 
         # Download the archive from the server (if it doesn't already exist)
         if not os.path.exists('.cache/packages/' + target):
             logging.debug('Downloading ' + v.url + ' to .cache/packages/' + target)
-            webreq = requests.get(v.url)
-            open('.cache/packages/' + target, 'wb').write(webreq.content)
+            ModPackages.limiter.acquire()
+            with _session.get(v.url, stream=True, timeout=30) as webreq:
+                webreq.raise_for_status()
+                _stream_to_file(webreq, '.cache/packages/' + target)
         else:
             logging.debug('.cache/packages/' + target + ' already in cache, skipping download')
-        
-        # Extract the package (and optionally to server if set)
-        self._extract_zip(target, 'client')
+
+    def _install_version(self, v: PackageVersion):
+        """
+        Internal method to install a given (already downloaded) version of this mod, dependencies are not checked
+
+        Parameters
+        ----------
+        v : PackageVersion
+            The version to install
+        """
+        logging.debug('Installing ' + self.name + ' ' + v.version)
+
+        target = self.name + '-' + v.version + '.zip'
+
+        # Extract the package (and optionally to server if set), the two destinations are independent
         if 'Server-side' in self.categories or self.name in ModPackages.config['override_server']:
-            self._extract_zip(target, 'server')
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                list(ex.map(lambda t: self._extract_zip(target, t), ('client', 'server')))
+        else:
+            self._extract_zip(target, 'client')
         
         # Update the install cache
         ModPackages.update_installed_cache(self, v.version)
@@ -242,6 +638,12 @@ class Package:
         if os.path.exists(s):
             logging.debug('Removing directory ' + s)
             shutil.rmtree(s)
+
+        for type in ('client', 'server'):
+            try:
+                os.remove(self._extract_marker(type))
+            except FileNotFoundError:
+                pass
         
         ModPackages.update_installed_cache(self, None)
         self.installed_version = None
@@ -278,23 +680,38 @@ class Package:
             Usually 'client' or 'server', allows the extract to target a specific destination type
         """
         # Pull package overrides (if set)
-        try:
-            source = Package.overrides[self.name]['source']
-        except:
-            source = None
+        override = Package.overrides.get(self.name, {})
+        source = override.get('source')
+        dest = override.get('dest', 'BepInEx/plugins/' + self.name)
         
+        # Skip the work entirely if this exact archive was the last one extracted here,
+        # (and one of the files it extracted is still there, the marker records the archive and that file)
+        marker = self._extract_marker(type)
         try:
-            dest = Package.overrides[self.name]['dest']
-        except:
-            dest = 'BepInEx/plugins/' + self.name
-        
-        with zipfile.ZipFile('.cache/packages/' + package) as zip:
+            with open(marker, 'r') as fp:
+                extracted, sample = fp.read().split('\n', 1)
+            if extracted == package and (sample == '' or os.path.exists(sample)):
+                logging.debug('Skipping extract of ' + package + ', already extracted to ' + type + '/' + dest)
+                return
+        except (FileNotFoundError, ValueError):
+            pass
+
+        archive = '.cache/packages/' + package
+        with zipfile.ZipFile(archive) as zip:
             logging.debug('Extracting ' + package + ' to ' + type + '/' + dest)
-            
+
+            # Work out where each file ends up first, keyed by destination so if multiple entries
+            # map to the same file only the last one is extracted (same as writing them in order).
+            members = {}
+
             # Specifying a source needs to iterate over every file contained
             # because extractall will simply extract an empty directory.
-            for f in zip.namelist():
+            for info in zip.infolist():
+                if info.is_dir():
+                    # Directories are created as needed for the files within them
+                    continue
 
+                f = info.filename
                 if source is not None:
                     # Only process files within the source directory (when specified)
                     if f.startswith(source):
@@ -322,14 +739,43 @@ class Package:
                         filename = filename[len(check):]
 
                 if not (filename is None or filename == '' or filename.endswith('/')):
-                    filename = os.path.join('.cache/' + type + '/', dest, filename)
-                    if not os.path.exists(os.path.dirname(filename)):
-                        os.makedirs(os.path.dirname(filename))
+                    members[os.path.join('.cache/' + type + '/', dest, filename)] = info
 
-                    sfile = zip.open(f)
-                    dfile = open(filename, 'wb')
-                    with sfile, dfile:
-                        shutil.copyfileobj(sfile, dfile)
+        # Decompression releases the GIL, so larger packages (BepInEx and friends) are split across threads,
+        # each with its own handle on the archive.
+        members = [(info, filename) for filename, info in members.items()]
+
+        # Most archives have many files in only a few directories, create each one once before extracting
+        for d in {os.path.dirname(filename) for info, filename in members}:
+            os.makedirs(d, exist_ok=True)
+
+        workers = min(_EXTRACT_WORKERS, len(members) // _EXTRACT_CHUNK)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                list(ex.map(lambda i: _extract_members(archive, members[i::workers]), range(workers)))
+        else:
+            _extract_members(archive, members)
+
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, 'w') as fp:
+            fp.write(package + '\n' + (members[0][1] if members else ''))
+
+    def _extract_marker(self, type: str) -> str:
+        """
+        Get the path of the file recording which archive was last extracted for this mod
+
+        These are kept outside of the client/server directories so they are never synced or exported.
+
+        Parameters
+        ----------
+        type : str
+            Usually 'client' or 'server'
+
+        Returns
+        -------
+        str
+        """
+        return os.path.join('.cache/extracted/', type, self.name)
 
 
 class ModPackages(object):
@@ -343,21 +789,35 @@ class ModPackages(object):
     installed : dict
         Dictionary of curently installed mods, keyed with the mod name.
         Contains `uuid` (str), `version` (str), and `updated` (float)
-    removed : list[str]
-        Flat list of mod names removed since the last deployment, useful for keeping local game in sync with uninstalls
+    removed : set[str]
+        Set of mod names removed since the last deployment, useful for keeping local game in sync with uninstalls
     config : dict
         Any configurable parameter within `config.yml`
     changed : dict
         Dictionary of changes pending for deployment, keyed with the mod UUID.
         contains `old` and `new` with either the version string or None for new installs / removals.
+    limiter : RateLimiter
+        Shared rate limiter for all requests sent to thunderstore.io
     """
 
     _initialized = False
+    _dirty: set[str] = set()
+    _lock = threading.RLock()
+    _changelog: list[str] = []
+    _by_uuid: dict[str, Package] = {}
+    _by_name_lower: dict[str, list[Package]] = {}
+    _by_url: dict[str, Package] = {}
+    _by_owner_name: dict[tuple[str, str], Package] = {}
+    _trigrams: dict[str, set[int]] = None
+    _installed_cache: list[Package] = None
+    _ssh: paramiko.SSHClient = None
+    _sftp: list[paramiko.SFTPClient] = []
     packages: list[Package] = []
     installed = None
     removed = None
     config = None
     changed = None
+    limiter = None
 
     @classmethod
     def init(cls) -> None:
@@ -371,6 +831,10 @@ class ModPackages(object):
             return
         cls._initialized = True
 
+        # Make sure any pending cache changes are written out, however the application exits
+        atexit.register(cls.flush)
+        atexit.register(cls._sftp_close)
+
         try:
             with open('config.yml', 'r') as file:
                 cls.config = yaml.safe_load(file)
@@ -404,6 +868,13 @@ class ModPackages(object):
         except KeyError:
             cls.config['override_server'] = []
 
+        # Older configuration files may not define the request rate
+        cls.config.setdefault('rate_limit', 5)
+        cls.limiter = RateLimiter(float(cls.config['rate_limit']))
+        cls.config.setdefault('download_workers', _DOWNLOAD_WORKERS)
+        cls.config.setdefault('sftp_workers', 4)
+        cls.config.setdefault('sftp_compress', True)
+
     @classmethod
     def load_caches(cls):
         """
@@ -411,35 +882,40 @@ class ModPackages(object):
         """
         # Read the install data
         try:
-            with open('.cache/installed.json', 'r') as fp:
-                cls.installed = json.load(fp)
-        except:
+            cls.installed = _json_load('.cache/installed.json')
+        except (FileNotFoundError, json.JSONDecodeError):
             cls.installed = {}
 
         # Read the removed data
         try:
-            with open('.cache/removed.json', 'r') as fp:
-                cls.removed = json.load(fp)
-        except:
-            cls.removed = []
+            cls.removed = set(_json_load('.cache/removed.json'))
+        except (FileNotFoundError, json.JSONDecodeError):
+            cls.removed = set()
 
         # Read the change data
         try:
-            with open('.cache/changed.json', 'r') as fp:
-                cls.changed = json.load(fp)
-        except:
+            cls.changed = _json_load('.cache/changed.json')
+        except (FileNotFoundError, json.JSONDecodeError):
             cls.changed = {}
 
         # Load all packages data
-        with open('.cache/packages.json', 'r') as fp:
-            data = json.load(fp)
-            for p in data:
-                pkg = Package(p)
-                try:
-                    pkg.installed_version = cls.installed[pkg.name]['version']
-                except KeyError:
-                    pass
-                cls.packages.append(pkg)
+        for p in _json_load('.cache/packages.json'):
+            pkg = Package(p)
+            try:
+                pkg.installed_version = cls.installed[pkg.name]['version']
+            except KeyError:
+                pass
+            cls.packages.append(pkg)
+
+            # Index for quick lookups
+            cls._by_uuid[pkg.uuid] = pkg
+            cls._by_name_lower.setdefault(pkg.name_lower, []).append(pkg)
+            cls._by_url[pkg.url] = pkg
+            cls._by_owner_name[(pkg.owner, pkg.name)] = pkg
+
+        # Rebuilt on the next loose search / listing
+        cls._trigrams = None
+        cls._installed_cache = None
 
     @classmethod
     def check_packages_fresh(cls):
@@ -448,24 +924,59 @@ class ModPackages(object):
         :return: boolean
         """
         # Ensure the packages.json file exists and is up to date
-        if not os.path.exists('.cache/packages.json'):
+        try:
+            mtime = os.stat('.cache/packages.json').st_mtime
+        except FileNotFoundError:
             # If the cache file isn't available, then it's clearly not fresh
             return False
-        else:
-            # 1 day: 86400
-            # 1 hour: 3600
-            timecheck = time.time() - 3600
-            return os.path.getmtime('.cache/packages.json') > timecheck
+
+        return mtime > time.time() - _PACKAGES_TTL
 
     @classmethod
-    def download_packages(cls):
+    def download_packages(cls) -> bool:
         """
         Download the full list of all packages and store locally
+
+        The ETag / Last-Modified headers from the previous download are sent along,
+        so an unchanged list is not transferred again.
+
+        Returns
+        -------
+        bool
+            True if a new copy was downloaded, False if the local copy is still current
         """
         url = 'https://valheim.thunderstore.io/api/v1/package/'
+        headers = {}
+        if os.path.exists('.cache/packages.json'):
+            try:
+                validators = _json_load('.cache/packages.json.etag')
+
+                if validators.get('etag') is not None:
+                    headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified') is not None:
+                    headers['If-Modified-Since'] = validators['last_modified']
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+
         logging.debug('Downloading ' + url + ' to .cache/packages.json')
-        webreq = requests.get(url, timeout=15)
-        open('.cache/packages.json', 'wb').write(webreq.content)
+        cls.limiter.acquire()
+        with _session.get(url, headers=headers, timeout=15, stream=True) as webreq:
+            if webreq.status_code == 304:
+                # Nothing changed upstream, just flag the local copy as fresh again
+                logging.debug('Packages list not modified, keeping .cache/packages.json')
+                os.utime('.cache/packages.json')
+                return False
+
+            webreq.raise_for_status()
+            _stream_to_file(webreq, '.cache/packages.json')
+
+        # Keep the cache validators for the next refresh
+        _json_dump({
+            'etag': webreq.headers.get('ETag'),
+            'last_modified': webreq.headers.get('Last-Modified')
+        }, '.cache/packages.json.etag')
+
+        return True
     
     @classmethod
     def search(cls, query: str) -> list[Package]:
@@ -490,15 +1001,12 @@ class ModPackages(object):
         url = None
         vers = None
 
-        if re.match('([^-]*)-([^-]*)-([^-]*)', query) is not None:
+        if groups := _DEP_RE.fullmatch(query):
             # Matches owner-name-version, used in dependency checks
             # example, "MaGic-Quick_Deposit-1.0.1"
-            groups = re.match('([^-]*)-([^-]*)-([^-]*)', query)
-            owner = groups.group(1)
-            name = groups.group(2)
-            vers = groups.group(3)
+            owner, name, vers = groups.groups()
             
-        elif 'https://valheim.thunderstore.io/package/' in query:
+        elif query.startswith('https://valheim.thunderstore.io/package/'):
             # https://valheim.thunderstore.io/package/CookieMilk/MajesticChickens/
             url = query
         else:
@@ -507,20 +1015,64 @@ class ModPackages(object):
         
         results = []
 
-        for p in cls.packages:
-            if name is not None:
-                if p.owner == owner and p.name == name:
-                    p.selected_version = vers
-                    results.append(p)
-            elif url is not None:
-                if p.url == url:
-                    results.append(p)
-            else:
-                if p.name.lower().find(query) != -1:
-                    results.append(p)
+        if name is not None:
+            # Exact lookups go straight to the owner/name index
+            p = cls._by_owner_name.get((owner, name))
+            if p is not None:
+                p.selected_version = vers
+                results.append(p)
+        elif url is not None:
+            p = cls._by_url.get(url)
+            if p is not None:
+                results.append(p)
+        else:
+            results = cls._search_names(query)
         
         return results
     
+    @classmethod
+    def _search_names(cls, query: str) -> list[Package]:
+        """
+        Internal method to find all packages containing a (lowercase) string within their name
+
+        Every substring of 3 or more characters shares all of its trigrams with the names containing it,
+        so only packages with every trigram of the query need to be checked.
+
+        Parameters
+        ----------
+        query : str
+            Lowercase string to search for
+
+        Returns
+        -------
+        list[Package]
+            Matching packages, in the same order as `packages`
+        """
+        if len(query) < 3:
+            # Too short to narrow down, (and short queries match a large portion anyway)
+            return [p for p in cls.packages if query in p.name_lower]
+
+        if cls._trigrams is None:
+            # Built on first use, most sessions never run a loose search
+            cls._trigrams = {}
+            for i, p in enumerate(cls.packages):
+                n = p.name_lower
+                for j in range(len(n) - 2):
+                    cls._trigrams.setdefault(n[j:j + 3], set()).add(i)
+
+        candidates = []
+        for g in {query[j:j + 3] for j in range(len(query) - 2)}:
+            ids = cls._trigrams.get(g)
+            if ids is None:
+                # No package contains this part of the query
+                return []
+            candidates.append(ids)
+
+        # Intersect starting from the smallest set
+        candidates.sort(key=len)
+        ids = set.intersection(*candidates)
+        return [cls.packages[i] for i in sorted(ids) if query in cls.packages[i].name_lower]
+
     @classmethod
     def get_installed_packages(cls) -> list[Package]:
         """
@@ -531,11 +1083,11 @@ class ModPackages(object):
         list[Package]
             List of all mod packages currently installed
         """
-        uuids = []
-        for k in cls.installed:
-            uuids.append(cls.installed[k]['uuid'])
-        
-        return cls.get_by_uuids(uuids)
+        # Cached until the next install/removal, (a copy is returned so callers are free to modify it)
+        if cls._installed_cache is None:
+            cls._installed_cache = cls.get_by_uuids([v['uuid'] for v in cls.installed.values()])
+
+        return list(cls._installed_cache)
 
     @classmethod
     def get_removed_packages(cls) -> list[Package]:
@@ -564,10 +1116,124 @@ class ModPackages(object):
         Package
             The mod package
         """
-        for p in cls.packages:
-            if p.uuid == uuid:
-                return p
+        return cls._by_uuid.get(uuid)
     
+    @classmethod
+    def get_by_name(cls, name: str) -> list[Package]:
+        """
+        Get all mod packages with exactly this name (multiple authors can publish under the same name)
+
+        Parameters
+        ----------
+        name : str
+            Name of the mod
+
+        Returns
+        -------
+        list[Package]
+            All packages with a matching name
+        """
+        return [p for p in cls._by_name_lower.get(name.lower(), []) if p.name == name]
+
+    @classmethod
+    def resolve_dep(cls, dep: str) -> Package | None:
+        """
+        Get the package for a dependency string and select the version it requires
+
+        Parameters
+        ----------
+        dep : str
+            Dependency in the format "owner-name-version", example "MaGic-Quick_Deposit-1.0.1"
+
+        Returns
+        -------
+        Package|None
+            The required package, or None if it's not listed on thunderstore.io
+        """
+        try:
+            owner, name, vers = dep.rsplit('-', 2)
+        except ValueError:
+            logging.warning('Invalid dependency string ' + dep)
+            return None
+
+        p = cls._by_owner_name.get((owner, name))
+        if p is None:
+            logging.warning('Unable to locate dependency ' + dep)
+        else:
+            p.selected_version = vers
+        return p
+
+    @classmethod
+    def plan_install(cls, root: Package) -> list[tuple[Package, PackageVersion]]:
+        """
+        Resolve a mod and any dependencies which need to be installed along with it
+
+        Each mod in the dependency graph is walked only once, so shared dependencies
+        (BepInExPack and friends) are not walked again for every mod requiring them,
+        unless a later mod requires a higher version than already planned.
+
+        Parameters
+        ----------
+        root : Package
+            The mod being installed, uses its `selected_version` if set or the latest otherwise
+
+        Returns
+        -------
+        list[tuple[Package, PackageVersion]]
+            Mods paired with the version to install, dependencies are listed before the mods requiring them
+        """
+        def resolve(pkg: Package):
+            if pkg.selected_version is not None:
+                v = pkg.get_version(pkg.selected_version)
+            else:
+                v = pkg.get_highest_version()
+            # Resolved lazily so each dependency's selected version is set just before it's checked
+            deps = (cls.resolve_dep(d) for d in v.dependencies)
+            return pkg, v, (p for p in deps if p is not None)
+
+        # Version planned for every mod in this install, keyed by UUID
+        planned = {}
+        plan = []
+        stack = [resolve(root)]
+        planned[root.uuid] = stack[0][1]
+        while stack:
+            pkg, v, deps = stack[-1]
+            if planned[pkg.uuid] is not v:
+                # Superseded by a higher version while its dependencies were being walked
+                stack.pop()
+                continue
+
+            for p in deps:
+                current = planned.get(p.uuid)
+                if current is not None:
+                    if current.parsed_version >= p.selected_parsed:
+                        # Already part of this install, (keep the selection on the version actually planned)
+                        p.selected_version = current.version
+                        continue
+
+                    # Required at a higher version than planned so far, its dependencies may differ too
+                    logging.debug('Higher version of dependency found, processing')
+                    with contextlib.suppress(ValueError):
+                        plan.remove((p, current))
+                elif p.installed_version is None:
+                    logging.debug('New dependency found, processing')
+                elif p.installed_parsed < p.selected_parsed:
+                    # Check if the installed is higher or it needs to be updated
+                    logging.debug('Updated dependency found, processing')
+                else:
+                    continue
+
+                # Descend into this dependency first, the rest of this mod's are picked up after
+                stack.append(resolve(p))
+                planned[p.uuid] = stack[-1][1]
+                break
+            else:
+                # All dependencies are planned
+                stack.pop()
+                plan.append((pkg, v))
+
+        return plan
+
     @classmethod
     def get_by_uuids(cls, uuids: list[str]) -> list[Package]:
         """
@@ -583,10 +1249,8 @@ class ModPackages(object):
         list[Package]
             All packages with matching UUID string
         """
-        packages = []
-        for p in cls.packages:
-            if p.uuid in uuids:
-                packages.append(p)
+        # (duplicates are only returned once)
+        packages = [cls._by_uuid[u] for u in set(uuids) if u in cls._by_uuid]
         
         # Sort them by name for convenience
         packages.sort(key=lambda pkg: pkg.name)
@@ -604,148 +1268,253 @@ class ModPackages(object):
         ver : str|None
             The version string (or None for removals) for the new version
         """
-        change = None
+        # Installs may run from worker threads, keep updates to the shared caches atomic
+        with cls._lock:
+            cls._installed_cache = None
+            change = None
 
-        # Update changed for use in changelog and rolling back updates
-        try:
-            # Existing keys just update the new (in case a version is updated multiple times before deployment)
-            cls.changed[pkg.uuid]['new'] = ver
-        except KeyError:
-            # New keys set both old and new
-            cls.changed[pkg.uuid] = {
-                'old': pkg.installed_version,
-                'new': ver
-            }
-
-        if ver is None:
-            # Package was removed
+            # Update changed for use in changelog and rolling back updates
             try:
-                del(cls.installed[pkg.name])
+                # Existing keys just update the new (in case a version is updated multiple times before deployment)
+                cls.changed[pkg.uuid]['new'] = ver
             except KeyError:
-                pass
+                # New keys set both old and new
+                cls.changed[pkg.uuid] = {
+                    'old': pkg.installed_version,
+                    'new': ver
+                }
+            cls._dirty.add('changed')
+
+            if ver is None:
+                # Package was removed
+                try:
+                    del(cls.installed[pkg.name])
+                    cls._dirty.add('installed')
+                except KeyError:
+                    pass
             
-            if pkg.name not in cls.removed:
-                cls.removed.append(pkg.name)
+                if pkg.name not in cls.removed:
+                    cls.removed.add(pkg.name)
+                    cls._dirty.add('removed')
 
-            # Make a note of this change
-            change = 'Removed ' + pkg.name + ' ' + pkg.installed_version
-        else:
-            # Package was updated / installed
-            if pkg.name in cls.removed:
-                del(cls.removed[cls.removed.index(pkg.name)])
-
-            cls.installed[pkg.name] = {
-                'version': ver,
-                'uuid': pkg.uuid,
-                'updated': datetime.datetime.now().timestamp()
-            }
-
-            # Make a note of this change (upgrade/downgrade)
-            if pkg.installed_version is None:
-                change = 'Install ' + pkg.name + ' ' + ver
-            elif version.parse(pkg.installed_version) < version.parse(ver):
-                change = 'Upgrade ' + pkg.name + ' from ' + pkg.installed_version + ' to ' + ver
+                # Make a note of this change
+                change = 'Removed ' + pkg.name + ' ' + pkg.installed_version
             else:
-                change = 'Dwngrad ' + pkg.name + ' from ' + pkg.installed_version + ' to ' + ver
+                # Package was updated / installed
+                if pkg.name in cls.removed:
+                    cls.removed.discard(pkg.name)
+                    cls._dirty.add('removed')
+
+                cls.installed[pkg.name] = {
+                    'version': ver,
+                    'uuid': pkg.uuid,
+                    'updated': time.time()
+                }
+                cls._dirty.add('installed')
+
+                # Make a note of this change (upgrade/downgrade)
+                if pkg.installed_version is None:
+                    change = 'Install ' + pkg.name + ' ' + ver
+                elif pkg.installed_parsed < version.parse(ver):
+                    change = 'Upgrade ' + pkg.name + ' from ' + pkg.installed_version + ' to ' + ver
+                else:
+                    change = 'Dwngrad ' + pkg.name + ' from ' + pkg.installed_version + ' to ' + ver
 
-        cls.installed = dict(sorted(cls.installed.items()))
+            if change is not None:
+                cls._changelog.append(datetime.datetime.now().isoformat(timespec='seconds') + ' ' + change + '\n')
 
-        with open('.cache/installed.json', 'w') as fp:
-            json.dump(cls.installed, fp, indent=4)
-        
-        with open('.cache/removed.json', 'w') as fp:
-            json.dump(cls.removed, fp, indent=4)
-        
-        with open('.cache/changed.json', 'w') as fp:
-            json.dump(cls.changed, fp, indent=4)
+    @classmethod
+    @contextlib.contextmanager
+    def batch(cls):
+        """
+        Group several installs/removals together, the caches are written once when the block exits
+        (even if it exits from an error or CTRL+C part way through)
 
-        if change is not None:
-            with open('.cache/changelog', 'a') as fp:
-                fp.write(datetime.datetime.now().isoformat() + ' ' + change + '\n')
+        Example
+        -------
+        with ModPackages.batch():
+            for p in packages:
+                p.install()
+        """
+        try:
+            yield
+        finally:
+            cls.flush()
 
     @classmethod
-    def sync_game(cls):
+    def flush(cls):
+        """
+        Write any pending changes of the install caches to disk
+
+        `update_installed_cache` only flags which caches changed, so bulk operations write each file once.
+        This is also called automatically on exit.
+        """
+        with cls._lock:
+            if cls._changelog:
+                with open('.cache/changelog', 'a') as fp:
+                    fp.writelines(cls._changelog)
+                cls._changelog.clear()
+
+            if 'installed' in cls._dirty:
+                _json_dump(cls.installed, '.cache/installed.json', sort_keys=True)
+
+            if 'removed' in cls._dirty:
+                _json_dump(sorted(cls.removed), '.cache/removed.json')
+
+            if 'changed' in cls._dirty:
+                _json_dump(cls.changed, '.cache/changed.json')
+
+            cls._dirty.clear()
+
+    @classmethod
+    def sync_game(cls, full: bool = False):
         """
         Sync installed mods to the local game client (useful for testing)
+
+        Files not modified since the previous sync are skipped without checking the game copy at all,
+        everything else is copied unless the game copy has the same modification time.
+
+        Parameters
+        ----------
+        full : bool
+            Set to ignore the record of the previous sync and compare every file against the game copy,
+            (picks up game copies deleted or edited by hand since the last sync)
         """
 
         # Install mods from the local cache
         srcdir = '.cache/client/'
-        for root, dirs, files in os.walk(srcdir):
-            for f in files:
-                s = os.path.join(root, f)
-                d = os.path.join(cls.config['gamedir'], s[len(srcdir):])
+
+        # Modification times of every file as of the last sync, files unchanged since then
+        # don't need the game copy checked
+        try:
+            index = _json_load('.cache/sync_index.json')
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        if not full and index.get('gamedir') == cls.config['gamedir'] and os.path.isdir(cls.config['gamedir']):
+            synced = index['files']
+        else:
+            synced = {}
+
+        current = {}
+        seen = set()
+        pairs = []
+        for entry in _walk_files(srcdir):
+            s = entry.path
+            rel = s[len(srcdir):]
+            d = os.path.join(cls.config['gamedir'], rel)
+            mtime = entry.stat().st_mtime_ns
+            current[rel] = mtime
+            if synced.get(rel) == mtime:
+                continue
+
+            try:
+                # Compare to see if the file has been modified
+                unchanged = mtime == os.stat(d).st_mtime_ns
+            except FileNotFoundError:
+                unchanged = False
+
+            if unchanged:
+                logging.debug('Skipping unchanged file ' + d)
+            else:
+                logging.debug('Copying file to ' + d)
+
                 p = os.path.dirname(d)
-                if os.path.exists(d) and os.path.getmtime(s) == os.path.getmtime(d):
-                    # Compare to see if the file has been modified
-                    logging.debug('Skipping unchanged file ' + d)
-                else:
-                    logging.debug('Copying file to ' + d)
+                if p not in seen:
+                    os.makedirs(p, exist_ok=True)
+                    seen.add(p)
+
+                pairs.append((s, d))
 
-                    if not os.path.exists(p):
-                        os.makedirs(p)
+        # Copying spends its time in the kernel with the GIL released, so copy several files at once.
+        # (copy2 is required to keep the modification times used for the comparison above)
+        with ThreadPoolExecutor(max_workers=_COPY_WORKERS) as ex:
+            list(ex.map(lambda sd: shutil.copy2(*sd), pairs))
 
-                    shutil.copy2(s, d)
+        _json_dump({'gamedir': cls.config['gamedir'], 'files': current}, '.cache/sync_index.json')
         
         # Remove any 'removed' mod
         for r in cls.removed:
             d = os.path.join(cls.config['gamedir'], 'BepInEx', 'plugins', r)
-            if os.path.exists(d):
-                logging.debug('Removing game mod ' + d)
+            try:
                 shutil.rmtree(d)
+                logging.debug('Removed game mod ' + d)
+            except FileNotFoundError:
+                # Already removed by a previous sync
+                pass
     
     @classmethod
-    def get_synced_packages(cls) -> list[Package]:
+    def get_game_manifests(cls) -> list[tuple[str, dict]]:
+        """
+        Read the manifest of every mod found in the local game client
+
+        Only the filesystem is used, so this is safe to call before the package caches are loaded.
+
+        Returns
+        -------
+        list[tuple[str, dict]]
+            Path and parsed data of every manifest.json found in the local game directory
+        """
+        manifests = []
+        d = os.path.join(cls.config['gamedir'], 'BepInEx', 'plugins')
+        for entry in _walk_files(d):
+            if entry.name == 'manifest.json':
+                manifest = entry.path
+                logging.debug('Found ' + manifest)
+                with open(manifest, 'rb') as fp:
+                    bin = fp.read()
+
+                # Detect the encoding from the BOM, some authors save their manifest as UTF-16
+                if bin[:2] in (b'\xff\xfe', b'\xfe\xff'):
+                    data = _json_loads(bin.decode('utf-16'))
+                else:
+                    try:
+                        data = _json_loads(bin.decode('utf-8-sig'))
+                    except UnicodeDecodeError:
+                        # UTF-16 without a BOM
+                        data = _json_loads(bin.decode('utf-16le'))
+
+                manifests.append((manifest, data))
+
+        return manifests
+
+    @classmethod
+    def get_synced_packages(cls, manifests: list[tuple[str, dict]] = None) -> list[Package]:
         """
         Get all packages which are installed in the local game client
 
+        Parameters
+        ----------
+        manifests : list[tuple[str, dict]]|None
+            Manifests previously read via `get_game_manifests`, read from the game directory if not provided
+
         Returns
         -------
         list[Package]
             All mods currently installed in the local game directory
         """
+        if manifests is None:
+            manifests = cls.get_game_manifests()
+
         packages = []
-        d = os.path.join(cls.config['gamedir'], 'BepInEx', 'plugins')
-        for root, dirs, files in os.walk(d):
-            for f in files:
-                if f == 'manifest.json':
-                    manifest = os.path.join(root, f)
-                    logging.debug('Found ' + manifest)
-                    m = magic.open(magic.MAGIC_MIME_ENCODING)
-                    m.load()
-                    with open(manifest, 'rb') as fp:
-                        # Auto-detect encoding and read binary blob
-                        bin = fp.read()
-                        try:
-                            data = json.loads(bin.decode("utf-8-sig"))
-                        except UnicodeDecodeError:
-                            bin = bin.decode("utf-16le").encode()
-                            data = json.loads(bin.decode("utf-8-sig"))
-
-                        pkgs = cls.search(data['name'])
-
-                        if len(pkgs) == 0:
-                            logging.warning('Unable to locate package for ' + manifest)
-                        else:
-                            # Search is a very open query, we want to be more exact.
-                            for p in pkgs:
-                                if p.name == data['name']:
-
-                                    if p.name in cls.installed:
-                                        # If it's already installed, we can narrow down to that specific UUID
-                                        if p.uuid == cls.installed[p.name]['uuid']:
-                                            p.selected_version = data['version_number']
-                                            packages.append(p)
-                                    else:
-                                        # Not installed, try to narrow down which package based on versions available
-                                        versions = []
-                                        for v in p.versions:
-                                            versions.append(v.version)
-
-                                        if data['version_number'] in versions:
-                                            p.selected_version = data['version_number']
-                                            packages.append(p)
-        
+        for manifest, data in manifests:
+            pkgs = cls.get_by_name(data['name'])
+
+            if len(pkgs) == 0:
+                logging.warning('Unable to locate package for ' + manifest)
+            else:
+                installed = cls.installed.get(data['name'])
+                for p in pkgs:
+                    if installed is not None:
+                        # If it's already installed, we can narrow down to that specific UUID
+                        if p.uuid == installed['uuid']:
+                            p.selected_version = data['version_number']
+                            packages.append(p)
+                    else:
+                        # Not installed, try to narrow down which package based on versions available
+                        if p.get_version(data['version_number']) is not None:
+                            p.selected_version = data['version_number']
+                            packages.append(p)
+
         return packages
 
     
@@ -763,11 +1532,9 @@ class ModPackages(object):
         srcdir = '.cache/client/'
         destzip = cls.config['exportprefix'] + '-' + datetime.datetime.now().strftime('%Y%m%d') + '.zip'
         ziptarget = os.path.join(cls.config['exportdir'], destzip)
-        with zipfile.ZipFile(ziptarget, 'w') as zip:
-            for root, dirs, files in os.walk(srcdir):
-                for f in files:
-                    p = os.path.join(root, f)
-                    zip.write(p, arcname=p[len(srcdir):])
+        with open(ziptarget, 'wb', buffering=_ZIP_BUFFER) as fp, zipfile.ZipFile(fp, 'w') as zip:
+            for entry in _walk_files(srcdir):
+                _zip_write(zip, entry.path, entry.path[len(srcdir):])
         
         return ziptarget
     
@@ -784,15 +1551,22 @@ class ModPackages(object):
 
         srcdir = '.cache/client/'
         destzip = cls.config['exportprefix'] + '-' + datetime.datetime.now().strftime('%Y%m%d') + '-update.zip'
-        check = datetime.datetime.now().timestamp() - (86400 * cls.config['updatedays'])
+        check = time.time() - (86400 * cls.config['updatedays'])
         ziptarget = os.path.join(cls.config['exportdir'], destzip)
-        with zipfile.ZipFile(ziptarget, 'w') as zip:
-            for k in cls.installed:
-                if cls.installed[k]['updated'] >= check and k != 'BepInExPack_Valheim':
-                    for root, dirs, files in os.walk(os.path.join(srcdir, 'BepInEx', 'plugins', k)):
-                        for f in files:
-                            p = os.path.join(root, f)
-                            zip.write(p, arcname=p[len(srcdir):])
+        updated = {k for k, v in cls.installed.items() if v['updated'] >= check and k != 'BepInExPack_Valheim'}
+
+        # One listing of the plugins directory gives every mod directory available to export
+        dirs = []
+        try:
+            with os.scandir(os.path.join(srcdir, 'BepInEx', 'plugins')) as it:
+                dirs = sorted(e.path for e in it if e.name in updated and e.is_dir())
+        except FileNotFoundError:
+            pass
+
+        with open(ziptarget, 'wb', buffering=_ZIP_BUFFER) as fp, zipfile.ZipFile(fp, 'w') as zip:
+            for d in dirs:
+                for entry in _walk_files(d):
+                    _zip_write(zip, entry.path, entry.path[len(srcdir):])
         
         return ziptarget
     
@@ -829,28 +1603,29 @@ class ModPackages(object):
                 updates.append('Updated ' + pkg.name + ' from ' + change['old'] + ' to ' + change['new'])
         
         if len(installs) > 0 or len(updates) > 0 or len(removes) > 0:
-            changes = '## ' + cls.config['exportprefix'] + ' ' + datetime.datetime.now().strftime('%Y-%m-%d') + '\n\n'
+            parts = ['## ', cls.config['exportprefix'], ' ', datetime.datetime.now().strftime('%Y-%m-%d'), '\n\n']
 
-            if len(installs) > 0:
-                changes += '*' + '\n*'.join(installs)
-            
-            if len(updates) > 0:
-                changes += '*' + '\n*'.join(updates)
-            
-            if len(removes) > 0:
-                changes += '*' + '\n*'.join(removes)
-            
-            changes += '\n\n'
+            # Each group ends with its own newline so the lists don't run into each other
+            for group in (installs, updates, removes):
+                if len(group) > 0:
+                    parts.append('*' + '\n*'.join(group) + '\n')
+
+            parts.append('\n')
+            changes = ''.join(parts)
         
             mdtarget = os.path.join(cls.config['exportdir'], 'CHANGELOG.md')
-            try:
-                with open(mdtarget, 'r') as f:
-                    changelog = f.read()
-            except FileNotFoundError:
-                changelog = ''
-            
-            with open(mdtarget, 'w') as f:
-                f.write(changes + changelog)
+
+            # Write the new entry followed by the existing changelog to a new file,
+            # so the (ever-growing) existing changelog is streamed across instead of read into memory.
+            tmp = mdtarget + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(changes)
+                try:
+                    with open(mdtarget, 'r') as src:
+                        shutil.copyfileobj(src, f, length=1 << 20)
+                except FileNotFoundError:
+                    pass
+            os.replace(tmp, mdtarget)
             
             return mdtarget
         else:
@@ -870,60 +1645,259 @@ class ModPackages(object):
         mdtarget = os.path.join(cls.config['exportdir'], 'MODS.md')
         with open(mdtarget, 'w') as f:
             f.write('# Mods Included\n\n')
-            for pkg in cls.get_installed_packages():
-                f.write('* ' + pkg.name + ' ' + pkg.installed_version + '\n')
+            f.writelines(f'* {pkg.name} {pkg.installed_version}\n' for pkg in cls.get_installed_packages())
 
         return mdtarget
 
     @classmethod
-    def export_server_sftp(cls):
-        with paramiko.SSHClient() as ssh:
-            ssh.load_system_host_keys()
-            ssh.connect(cls.config['sftp_host'], username=cls.config['sftp_user'])
+    def _sftp_channels(cls) -> list[paramiko.SFTPClient]:
+        """
+        Internal method to get the SFTP channels to the dedicated server, connecting if necessary
 
-            sftp = ssh.open_sftp()
+        The connection is kept open for the rest of the session, so repeated deployments skip the SSH handshake.
 
+        Returns
+        -------
+        list[paramiko.SFTPClient]
+            `sftp_workers` open channels, each already in `sftp_path`
+        """
+        transport = cls._ssh.get_transport() if cls._ssh is not None else None
+        if transport is None or not transport.is_active():
+            cls._sftp_close()
+            cls._ssh = paramiko.SSHClient()
+            cls._ssh.load_system_host_keys()
+            # Manifests, configs and most DLLs compress well, (falls back silently if the server doesn't support it)
+            cls._ssh.connect(cls.config['sftp_host'], username=cls.config['sftp_user'], compress=cls.config['sftp_compress'])
+            transport = cls._ssh.get_transport()
+
+        # Several SFTP channels over the one connection, so a round-trip on one file doesn't hold up the rest.
+        # A large channel window lets paramiko keep writes in flight instead of stalling on acknowledgements
+        cls._sftp = [sftp for sftp in cls._sftp if not sftp.get_channel().closed]
+        while len(cls._sftp) < cls.config['sftp_workers']:
+            sftp = paramiko.SFTPClient.from_transport(transport, window_size=paramiko.common.MAX_WINDOW_SIZE)
             sftp.chdir(cls.config['sftp_path'])
+            cls._sftp.append(sftp)
+
+        return cls._sftp
+
+    @classmethod
+    def _sftp_close(cls):
+        """
+        Internal method to close the connection to the dedicated server (if open), called automatically on exit
+        """
+        for sftp in cls._sftp:
+            sftp.close()
+        cls._sftp = []
+
+        if cls._ssh is not None:
+            cls._ssh.close()
+            cls._ssh = None
+
+    @classmethod
+    def _upload_tar(cls, files: list[tuple[str, str, list]]) -> bool:
+        """
+        Internal method to upload a set of files to the dedicated server as a tar stream over SSH
 
-            srcdir = '.cache/server/'
-            for root, dirs, files in os.walk(srcdir):
-                for f in files:
-                    d = os.path.join(root, f)[len(srcdir):]
-                    p = os.path.dirname(d)
-                    logging.debug('Uploading ' + d)
+        Requires `tar` on the server, if it's not available (or fails) nothing is recorded
+        and the files should be uploaded over SFTP instead.
+
+        Parameters
+        ----------
+        files : list[tuple[str, str, list]]
+            Local filename, remote filename (relative to `sftp_path`) and ledger key of each file
+
+        Returns
+        -------
+        bool
+            True if every file was extracted on the server
+        """
+        logging.debug('Uploading ' + str(len(files)) + ' files as a tar stream')
+        command = 'cd ' + shlex.quote(cls.config['sftp_path']) + ' && tar -xf -'
+        try:
+            stdin, stdout, stderr = cls._ssh.exec_command(command)
+            with tarfile.open(fileobj=stdin, mode='w|') as tf:
+                for local, remote, key in files:
+                    tf.add(local, arcname=remote)
+            stdin.channel.shutdown_write()
+            status = stdout.channel.recv_exit_status()
+        except (OSError, paramiko.SSHException) as e:
+            logging.warning('Unable to upload tar stream, falling back to SFTP: ' + str(e))
+            return False
+
+        if status != 0:
+            logging.warning('Unable to extract tar stream, falling back to SFTP: ' + stderr.read().decode(errors='replace'))
+            return False
+
+        return True
+
+    @classmethod
+    def export_server_sftp(cls):
+        """
+        Upload the server mods to the dedicated server
+
+        Files are written under a temporary name next to their destination and only renamed into place
+        once every upload has finished, so the server never loads a partially written mod.
+        Large batches of small files sent as a tar stream are extracted in place,
+        but only once everything else has been staged successfully.
+        """
+        channels = cls._sftp_channels()
+        clients = queue.SimpleQueue()
+        for sftp in channels:
+            clients.put(sftp)
+
+        # Size and modification time of every file as of its last successful upload
+        target = cls.config['sftp_host'] + ':' + cls.config['sftp_path']
+        try:
+            ledger = _json_load('.cache/server-ledger.json')
+        except (FileNotFoundError, json.JSONDecodeError):
+            ledger = {}
+        if ledger.get('target') == target:
+            uploaded = ledger['files']
+        else:
+            # Different server (or never deployed), everything needs to go up
+            uploaded = {}
+
+        current = {}
+        suffix = '.staging-' + uuid.uuid4().hex[:8]
+        staged = []
+
+        def upload(local: str, remote: str, key: list):
+            sftp = clients.get()
+            try:
+                logging.debug('Uploading ' + remote)
+                # Pipelined writes don't wait for each request to be acknowledged (only checked on close),
+                # the large local reads are split up by paramiko into MAX_REQUEST_SIZE requests.
+                # (MAX_REQUEST_SIZE is left alone, OpenSSH rejects requests much larger than the default)
+                try:
+                    # Local reads are unbuffered into one reusable chunk buffer per file,
+                    # (paramiko doesn't buffer writes by default, so each chunk goes straight out)
+                    buf = bytearray(min(max(key[0], 1), 1 << 20))
+                    view = memoryview(buf)
+                    with open(local, 'rb', buffering=0) as fl, sftp.open(remote + suffix, 'wb') as rf:
+                        rf.set_pipelined(True)
+                        while n := fl.readinto(buf):
+                            rf.write(view[:n])
+                except BaseException:
+                    # Don't leave the partial upload behind, (without masking the original error)
+                    with contextlib.suppress(*_SFTP_ERRORS):
+                        sftp.remove(remote + suffix)
+                    raise
+                staged.append((remote, key))
+            finally:
+                clients.put(sftp)
+
+        def publish(remote: str, key: list):
+            sftp = clients.get()
+            try:
+                try:
+                    # Replaces the existing file in one step
+                    sftp.posix_rename(remote + suffix, remote)
+                except IOError:
+                    # Server without the posix-rename extension, plain rename refuses to overwrite
                     try:
-                        sftp.put(os.path.join(root, f), d)
+                        sftp.remove(remote)
                     except FileNotFoundError:
-                        # Most common issue, directory does not exist yet.
-                        p2 = ''
-                        while p != '':
-                            try:
-                                p2 = os.path.join(p2, p[0:p.index('/')])
-                                p = p[p.index('/')+1:]
-                            except ValueError:
-                                p2 = os.path.join(p2, p)
-                                p = ''
-
-                            try:
-                                sftp.mkdir(p2)
-                                logging.debug('Auto created directory ' + p2)
-                            except IOError:
-                                pass
-                        # Perform the upload attempt again
-                        sftp.put(os.path.join(root, f), d)
-            sftp.close()
+                        pass
+                    sftp.rename(remote + suffix, remote)
+                current[remote] = key
+            finally:
+                clients.put(sftp)
+
+        def discard(remote: str):
+            sftp = clients.get()
+            try:
+                sftp.remove(remote + suffix)
+            except _SFTP_ERRORS:
+                pass
+            finally:
+                clients.put(sftp)
+
+        srcdir = '.cache/server/'
+        uploads = []
+        for entry in _walk_files(srcdir):
+            # (remote paths always use '/', regardless of the local OS)
+            remote = entry.path[len(srcdir):].replace(os.sep, '/')
+            st = entry.stat()
+            key = [st.st_size, st.st_mtime_ns]
+            if uploaded.get(remote) == key:
+                # Unchanged since it was last uploaded
+                current[remote] = key
+            else:
+                uploads.append((entry.path, remote, key))
+
+        def ensure_dir(p: str):
+            sftp = clients.get()
+            try:
+                # After the first deployment nearly every directory already exists
+                sftp.stat(p)
+            except FileNotFoundError:
+                try:
+                    sftp.mkdir(p)
+                    logging.debug('Created directory ' + p)
+                except IOError:
+                    pass
+            finally:
+                clients.put(sftp)
+
+        # Create every remote directory up front, so the uploads never need to retry.
+        # Grouped by depth so each level can be checked in parallel once its parents exist,
+        # (parents always ends with '.', the sftp_path itself which already exists)
+        levels = {}
+        for local, remote, key in uploads:
+            for p in PurePosixPath(remote).parents[:-1]:
+                levels.setdefault(len(p.parts), set()).add(str(p))
+
+        # Lots of small files spend most of their time on per-file round-trips, send them all in one go instead
+        small = [u for u in uploads if u[2][0] < _TAR_MAX_SIZE]
+        if len(small) >= _TAR_MIN_FILES:
+            uploads = [u for u in uploads if u[2][0] >= _TAR_MAX_SIZE]
+        else:
+            small = []
+
+        def run(ex: ThreadPoolExecutor, fn, items: list):
+            # Every task has finished (or failed) by the time this returns, so cleanup never races an upload
+            futures = [ex.submit(fn, *i) for i in items]
+            wait(futures)
+            for future in futures:
+                future.result()
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(channels)) as ex:
+                for depth in sorted(levels):
+                    run(ex, ensure_dir, [(p,) for p in levels[depth]])
+                try:
+                    run(ex, upload, uploads)
+                    if small:
+                        # Only extracted once everything else is staged, so a failed upload leaves the server untouched
+                        if cls._upload_tar(small):
+                            for local, remote, key in small:
+                                current[remote] = key
+                        else:
+                            run(ex, upload, small)
+                    run(ex, publish, staged)
+                except BaseException:
+                    # Leave the server as it was, (minus anything already moved into place)
+                    run(ex, discard, [(remote,) for remote, key in staged if remote not in current])
+                    raise
+        finally:
+            # Record whatever made it, even if the upload was interrupted part way
+            _json_dump({'target': target, 'files': current}, '.cache/server-ledger.json')
 
     @classmethod
     def commit_changes(cls):
         """
         Mark everything as deployed and remove the pending caches
         """
-        if os.path.exists('.cache/changed.json'):
-            os.remove('.cache/changed.json')
-        
-        if os.path.exists('.cache/removed.json'):
-            os.remove('.cache/removed.json')
-        
+        for f in ('.cache/changed.json', '.cache/removed.json'):
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+
         cls.changed = {}
-        cls.removed = []
+        cls.removed = set()
+        cls._installed_cache = None
+        # Nothing left pending for these
+        cls._dirty.discard('changed')
+        cls._dirty.discard('removed')
 